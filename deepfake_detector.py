@@ -2,6 +2,7 @@
 Deepfake and Photo Manipulation Detection
 Analyzes photos for AI-generated or manipulated content
 """
+import io
 import os
 from PIL import Image
 from PIL.ExifTags import TAGS
@@ -11,23 +12,40 @@ from datetime import datetime
 import hashlib
 
 
-def detect_photo_manipulation(image_path: str) -> dict:
+def _open_image(image) -> Image.Image:
+    """Return a PIL image for a path, raw bytes, or an already opened image"""
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, (bytes, bytearray)):
+        return Image.open(io.BytesIO(image))
+    return Image.open(image)
+
+
+def detect_photo_manipulation(image_path) -> dict:
     """
     Detect if photo is AI-generated or manipulated
     
     Args:
-        image_path: Path to image file
+        image_path: Path to image file, or the raw image bytes
     
     Returns:
         Dictionary with detection results
     """
     
+    # Decode once and share the image across all checks
+    image = image_path
+    try:
+        image = _open_image(image_path)
+        image.load()
+    except Exception as e:
+        print(f"Error opening image: {e}")
+    
     results = {
-        'ai_generated_probability': check_ai_artifacts(image_path),
-        'manipulation_detected': detect_photoshop_traces(image_path),
-        'metadata_tampering': check_exif_manipulation(image_path),
-        'consistency_score': check_lighting_physics(image_path),
-        'duplicate_detection': check_duplicate_regions(image_path)
+        'ai_generated_probability': check_ai_artifacts(image),
+        'manipulation_detected': detect_photoshop_traces(image),
+        'metadata_tampering': check_exif_manipulation(image),
+        'consistency_score': check_lighting_physics(image),
+        'duplicate_detection': check_duplicate_regions(image)
     }
     
     # Calculate overall authenticity score
@@ -64,7 +82,7 @@ def check_ai_artifacts(image_path: str) -> float:
         Probability score (0-1) that image is AI-generated
     """
     try:
-        img = Image.open(image_path)
+        img = _open_image(image_path)
         img_array = np.array(img)
         
         # Check for common AI artifacts
@@ -104,7 +122,7 @@ def detect_photoshop_traces(image_path: str) -> float:
         Probability score (0-1) of manipulation
     """
     try:
-        img = Image.open(image_path)
+        img = _open_image(image_path)
         
         score = 0.0
         
@@ -138,7 +156,7 @@ def check_exif_manipulation(image_path: str) -> float:
         Probability score (0-1) of tampering
     """
     try:
-        img = Image.open(image_path)
+        img = _open_image(image_path)
         exif_data = get_exif_data(img)
         
         if not exif_data:
@@ -175,7 +193,7 @@ def check_lighting_physics(image_path: str) -> float:
         Consistency score (0-1, higher is more consistent)
     """
     try:
-        img = Image.open(image_path)
+        img = _open_image(image_path)
         img_array = np.array(img)
         
         if len(img_array.shape) != 3:
@@ -210,7 +228,7 @@ def check_duplicate_regions(image_path: str) -> float:
         Probability score (0-1) of duplication
     """
     try:
-        img = Image.open(image_path)
+        img = _open_image(image_path)
         img_array = np.array(img)
         
         # Simple duplicate detection using block matching
@@ -379,13 +397,30 @@ def has_impossible_reflections(img_array: np.ndarray) -> bool:
 
 
 # Streamlit integration
-def display_deepfake_analysis(image_path: str, image_name: str = "Photo"):
+def display_deepfake_analysis(image_bytes, image_name: str = "Photo"):
     """
     Display deepfake analysis in Streamlit
     
     Args:
-        image_path: Path to image file
+        image_bytes: Raw image bytes (a file path is also accepted)
+        image_name: Display name for image
+    """
+    import streamlit as st
+    
+    with st.spinner("🔍 Analyzing photo for manipulation..."):
+        results = detect_photo_manipulation(image_bytes)
+    
+    render_deepfake_analysis(image_bytes, image_name, results)
+
+
+def render_deepfake_analysis(image, image_name: str, results: dict):
+    """
+    Render precomputed deepfake analysis results in Streamlit
+    
+    Args:
+        image: Image path or raw bytes, anything st.image accepts
         image_name: Display name for image
+        results: Output of detect_photo_manipulation
     """
     import streamlit as st
     
@@ -395,13 +430,9 @@ def display_deepfake_analysis(image_path: str, image_name: str = "Photo"):
     
     with col1:
         # Display image
-        st.image(image_path, caption=image_name, use_container_width=True)
+        st.image(image, caption=image_name, use_container_width=True)
     
     with col2:
-        # Run analysis
-        with st.spinner("🔍 Analyzing photo for manipulation..."):
-            results = detect_photo_manipulation(image_path)
-        
         # Display authenticity score
         authenticity = results['authenticity_score']
         
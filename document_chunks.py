@@ -0,0 +1,27 @@
+"""
+Document Chunking Helpers
+Lives outside the Streamlit script so chunk objects kept in session state
+keep the same class across reruns and can be pickled into snapshots
+"""
+from collections.abc import Sequence
+
+
+class LazyChunks(Sequence):
+    """Fixed-size windows over a string, sliced on access rather than up front."""
+
+    def __init__(self, text: str, size: int = 1200):
+        self._text = text
+        self._size = size
+
+    def __len__(self) -> int:
+        return -(-len(self._text) // self._size)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        start = index * self._size
+        return self._text[start : start + self._size]
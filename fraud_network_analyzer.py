@@ -262,6 +262,19 @@ class FraudNetworkAnalyzer:
             return "LOW"
 
 
+def compute_network_analysis(claim_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run the network analysis without touching Streamlit
+    
+    Args:
+        claim_data: Current claim information
+        
+    Returns:
+        Network analysis results, as consumed by render_network_analysis
+    """
+    return FraudNetworkAnalyzer().analyze_network(claim_data)
+
+
 def display_network_analysis(claim_data: Dict[str, Any]):
     """
     Streamlit component to display fraud network analysis
@@ -271,12 +284,21 @@ def display_network_analysis(claim_data: Dict[str, Any]):
     """
     import streamlit as st
     
-    # Initialize analyzer
-    analyzer = FraudNetworkAnalyzer()
-    
     # Run analysis
     with st.spinner("🕸️ Analyzing fraud collaboration network..."):
-        results = analyzer.analyze_network(claim_data)
+        results = compute_network_analysis(claim_data)
+    
+    render_network_analysis(results)
+
+
+def render_network_analysis(results: Dict[str, Any]):
+    """
+    Render precomputed network analysis results in Streamlit
+    
+    Args:
+        results: Output of compute_network_analysis
+    """
+    import streamlit as st
     
     # Display header
     st.markdown("### 🕸️ Fraud Collaboration Network Analysis")
@@ -3,42 +3,120 @@ ReconAI - Multi-Agent Insurance Fraud Detection System
 Orchestrated multi-agent analysis with Landing AI ADE + Gemini 2.5 Flash
 """
 import os
-import json
+import hashlib
+import html
+import pickle
+import orjson
 import streamlit as st
+import shutil
 import tempfile
+import traceback
 from datetime import datetime
 import asyncio
 import random
-from itertools import cycle
-from typing import List
+from typing import Dict, List, Tuple
+from collections import defaultdict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from jinja2 import Environment
 import re
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
 
 # Import multi-agent system
 from agents_v2.orchestrator import FraudOrchestrator
 
 # Import breakthrough features
-from fraud_story_generator import display_fraud_story, generate_fraud_narrative, format_narrative_for_display
-from deepfake_detector import display_deepfake_analysis, detect_photo_manipulation
-from fraud_network_analyzer import display_network_analysis
+from fraud_story_generator import (
+    display_fraud_story,
+    generate_fraud_narrative,
+    format_narrative_for_display,
+    prefetch_narrative,
+    resolve_narrative,
+)
+from document_chunks import LazyChunks
+from deepfake_detector import detect_photo_manipulation, render_deepfake_analysis
+from fraud_network_analyzer import compute_network_analysis, render_network_analysis
 
 load_dotenv()
 
+# Braille spinner frames for the analysis progress line
+SPINNER = ("⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏")
+
 # Directory storage configuration
 DATAROOM_ROOT = Path("datarooms")
 DATAROOM_ROOT.mkdir(parents=True, exist_ok=True)
 
 
+_SLUG_NONALNUM = re.compile(r"[^a-zA-Z0-9]+")
+_SLUG_DASHES = re.compile(r"-{2,}")
+
+
 def slugify(name: str) -> str:
-    base = re.sub(r"[^a-zA-Z0-9]+", "-", name.strip().lower())
-    base = re.sub(r"-{2,}", "-", base).strip("-")
+    base = _SLUG_NONALNUM.sub("-", name.strip().lower())
+    base = _SLUG_DASHES.sub("-", base).strip("-")
     if not base:
         base = f"dataroom-{int(datetime.now().timestamp())}"
     return base
 
 
+def _chunk_texts(items, keys: Tuple[str, ...], stringify_other: bool = False):
+    if isinstance(items, str):
+        yield items
+        return
+    if not isinstance(items, list):
+        return
+    for item in items:
+        if isinstance(item, dict):
+            text_value = next((item[k] for k in keys if item.get(k)), None)
+            if text_value:
+                yield str(text_value)
+        elif isinstance(item, str):
+            if item:
+                yield item
+        elif stringify_other:
+            yield str(item)
+
+
+def iter_chunks(doc_extraction: dict):
+    """Yield chunk texts from the parser output, falling back to splits when there are no chunks."""
+    found = False
+    for text in _chunk_texts(doc_extraction.get("chunks", []), ("text", "content", "markdown"), True):
+        found = True
+        yield text
+    if not found:
+        yield from _chunk_texts(doc_extraction.get("splits", []), ("text", "content"))
+
+
+# Chat retrieval only considers the leading chunks of a document
+RETRIEVAL_CHUNK_LIMIT = 20
+
+# The synthesis prompt uses at most this many retrieved chunks
+RETRIEVED_CHUNK_LIMIT = 5
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def build_chunk_index(chunks) -> Dict[str, frozenset]:
+    """Map each lowercase word token to the indices of the retrievable chunks containing it."""
+    index: Dict[str, set] = defaultdict(set)
+    for chunk_idx, chunk in enumerate(chunks[:RETRIEVAL_CHUNK_LIMIT]):
+        for token in _TOKEN_RE.findall(str(chunk).lower()):
+            index[token].add(chunk_idx)
+    return {token: frozenset(ids) for token, ids in index.items()}
+
+
+def chunk_index_for(chunks) -> Dict[str, frozenset]:
+    """Keyword index of `chunks`, rebuilt when the stored one was built from other chunks."""
+    # Stored next to the chunks it indexes so a stale index can't point past them
+    stored = st.session_state.get("chunk_index")
+    if not isinstance(stored, tuple) or stored[0] is not chunks:
+        stored = st.session_state.chunk_index = (chunks, build_chunk_index(chunks))
+    return stored[1]
+
+
 def dataroom_path(slug: str) -> Path:
     return DATAROOM_ROOT / slug
 
@@ -52,12 +130,85 @@ def human_date(iso_ts: str) -> str:
         return iso_ts
 
 
-def load_dataroom_records() -> List[dict]:
-    records: List[dict] = []
-    for folder in DATAROOM_ROOT.iterdir():
-        if not folder.is_dir():
+# Per-dataroom files: small, frequently rewritten metadata (JSON, kept readable)
+# plus the bulky session snapshot (pickle), which is only rewritten when its
+# content hash changes.
+# Directories saved before the split keep everything in LEGACY_DATA_FILE.
+METADATA_FILE = "metadata.json"
+SESSION_FILE = "session.bin"
+DOCUMENT_FILE = "document.md"
+LEGACY_DATA_FILE = "data.json"
+
+# Session state keeps only this much extracted markdown; the full text lives in DOCUMENT_FILE
+DOCUMENT_CONTENT_LIMIT = 50000
+
+# Extraction payloads dropped from the stored analysis result; the full text lives in DOCUMENT_FILE
+BULKY_EXTRACTION_FIELDS = ("markdown", "raw_chunks", "raw_splits", "raw_grounding")
+
+@st.cache_resource
+def _records_cache() -> Dict[str, Tuple[int, dict]]:
+    # Parsed dataroom metadata keyed by folder name, tagged with the source file's mtime.
+    # Cached as a resource because Streamlit re-executes this script on every rerun
+    return {}
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        return orjson.loads(path.read_bytes())
+    except Exception:
+        return {}
+
+
+def _read_session(path: Path) -> dict:
+    try:
+        raw = path.read_bytes()
+    except OSError:
+        return {}
+    try:
+        # Pickles start with the PROTO opcode; older session files are JSON
+        if raw[:1] == b"\x80":
+            return pickle.loads(raw)
+        return orjson.loads(raw)
+    except Exception:
+        return {}
+
+
+def load_dataroom_metadata(slug: str) -> dict:
+    folder = dataroom_path(slug)
+    meta_file = folder / METADATA_FILE
+    if meta_file.exists():
+        return _read_json(meta_file)
+    return _read_json(folder / LEGACY_DATA_FILE).get("metadata", {})
+
+
+def _record_source(folder: Path):
+    """Metadata file of a dataroom and its mtime, or None when it has neither file."""
+    for name in (METADATA_FILE, LEGACY_DATA_FILE):
+        source = folder / name
+        try:
+            return source, source.stat().st_mtime_ns
+        except OSError:
             continue
-        data_file = folder / "data.json"
+    return None
+
+
+def _load_record(source: Path):
+    """Parsed metadata from a dataroom's metadata file, or None when it can't be read."""
+    try:
+        data = orjson.loads(source.read_bytes())
+    except Exception:
+        return None
+    return data if source.name == METADATA_FILE else data.get("metadata", {})
+
+
+def load_dataroom_records() -> List[dict]:
+    with os.scandir(DATAROOM_ROOT) as it:
+        # DirEntry.is_dir() is answered from the directory read, no extra stat
+        folders = [Path(entry.path) for entry in it if entry.is_dir(follow_symlinks=False)]
+    cache = _records_cache()
+    records = []
+    misses = []
+    for folder in folders:
         metadata = {
             "name": folder.name,
             "slug": folder.name,
@@ -65,14 +216,25 @@ def load_dataroom_records() -> List[dict]:
             "updated_at": None,
             "last_filename": None,
         }
-        if data_file.exists():
-            try:
-                with data_file.open("r", encoding="utf-8") as f:
-                    data = json.load(f)
-                metadata.update(data.get("metadata", {}))
-            except Exception:
-                pass
         records.append(metadata)
+        found = _record_source(folder)
+        if found is None:
+            continue
+        cached = cache.get(folder.name)
+        if cached and cached[0] == found[1]:
+            metadata.update(cached[1])
+        else:
+            misses.append((metadata, *found))
+    if misses:
+        sources = [source for _, source, _ in misses]
+        # Reads release the GIL, so several cold metadata files load in parallel
+        loaded = _worker_pool().map(_load_record, sources) if len(sources) > 1 else map(_load_record, sources)
+        for (metadata, _, mtime_ns), stored in zip(misses, loaded):
+            if stored is None:
+                continue
+            # Filled in here rather than in the workers, which run outside the script context
+            cache[metadata["slug"]] = (mtime_ns, stored)
+            metadata.update(stored)
     records.sort(
         key=lambda r: r.get("updated_at") or r.get("created_at") or "",
         reverse=True,
@@ -81,30 +243,35 @@ def load_dataroom_records() -> List[dict]:
 
 
 def load_dataroom_data(slug: str) -> dict:
-    data_file = dataroom_path(slug) / "data.json"
-    if not data_file.exists():
-        return {}
-    try:
-        with data_file.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    folder = dataroom_path(slug)
+    meta_file = folder / METADATA_FILE
+    if not meta_file.exists():
+        return _read_json(folder / LEGACY_DATA_FILE)
+    return {
+        "metadata": _read_json(meta_file),
+        "session": _read_session(folder / SESSION_FILE),
+    }
+
+
+def _create_dataroom(slug: str) -> Path:
+    """Create a new dataroom folder; raises FileExistsError if the slug is taken."""
+    folder = dataroom_path(slug)
+    folder.mkdir(parents=True, exist_ok=False)
+    return folder
 
 
 def save_dataroom_snapshot(slug: str, display_name: str):
     folder = dataroom_path(slug)
     folder.mkdir(parents=True, exist_ok=True)
-    data_file = folder / "data.json"
 
-    existing = load_dataroom_data(slug)
-    metadata = existing.get("metadata", {})
+    metadata = load_dataroom_metadata(slug)
+    now_iso = datetime.now().isoformat()
     metadata.update(
         {
             "name": display_name,
             "slug": slug,
-            "created_at": metadata.get("created_at")
-            or datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
+            "created_at": metadata.get("created_at") or now_iso,
+            "updated_at": now_iso,
             "last_filename": st.session_state.get("filename"),
             "last_summary": st.session_state.get("full_result", {}).get("summary"),
             "last_risk_level": st.session_state.get("full_result", {}).get(
@@ -127,11 +294,45 @@ def save_dataroom_snapshot(slug: str, display_name: str):
         for key in session_snapshot_keys
         if key in st.session_state
     }
+    chunks = session_snapshot.get("document_chunks")
+    if isinstance(chunks, Sequence) and not isinstance(chunks, (list, str)):
+        # Snapshots store plain lists so they don't depend on the lazy wrapper
+        session_snapshot["document_chunks"] = list(chunks)
+
+    # Only rewrite the session file when its content actually changed
+    session_file = folder / SESSION_FILE
+    session_bytes = pickle.dumps(session_snapshot, protocol=5)
+    session_hash = hashlib.blake2b(session_bytes, digest_size=16).hexdigest()
+    if metadata.get("session_hash") != session_hash or not session_file.exists():
+        session_file.write_bytes(session_bytes)
+        metadata["session_hash"] = session_hash
+
+    (folder / METADATA_FILE).write_bytes(
+        orjson.dumps(metadata, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    )
 
-    payload = {"metadata": metadata, "session": session_snapshot}
 
-    with data_file.open("w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
+def save_dataroom_document(slug: str, markdown: str):
+    folder = dataroom_path(slug)
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / DOCUMENT_FILE).write_text(markdown, encoding="utf-8")
+
+
+def load_dataroom_document(slug: str) -> str:
+    try:
+        return (dataroom_path(slug) / DOCUMENT_FILE).read_text(encoding="utf-8")
+    except OSError:
+        return ""
+
+
+def slim_result(result: dict) -> dict:
+    """Copy of an analysis result without the raw document payloads, for session state and snapshots."""
+    agent_results = result.get("agent_results", {})
+    extraction = agent_results.get("document_extraction")
+    if not extraction:
+        return result
+    extraction = {k: v for k, v in extraction.items() if k not in BULKY_EXTRACTION_FIELDS}
+    return {**result, "agent_results": {**agent_results, "document_extraction": extraction}}
 
 
 def apply_dataroom_session(data: dict):
@@ -140,8 +341,326 @@ def apply_dataroom_session(data: dict):
         return
     for key, value in session_data.items():
         st.session_state[key] = value
+    if "full_result" in session_data:
+        # Older snapshots still carry the raw extraction payloads
+        st.session_state.full_result = slim_result(session_data["full_result"])
     st.session_state.analysis_complete = session_data.get("analysis_complete", True)
-    st.session_state.document_chunks = session_data.get("document_chunks", [])
+    st.session_state.document_content_head = (st.session_state.get("document_content") or "")[:5000]
+    st.session_state.document_chunks = session_data.get("document_chunks") or []
+    if not st.session_state.document_chunks:
+        # Rebuild chunks from the stored full document when the snapshot has none
+        slug = data.get("metadata", {}).get("slug")
+        full_markdown = load_dataroom_document(slug) if slug else ""
+        if full_markdown:
+            st.session_state.document_chunks = LazyChunks(full_markdown[:DOCUMENT_CONTENT_LIMIT], 1200)
+    chunk_index_for(st.session_state.document_chunks)
+
+
+RISK_COLORS = {
+    "CRITICAL": "#D32F2F",
+    "HIGH": "#FF9800",
+    "MEDIUM": "#F57C00",
+    "LOW": "#4CAF50",
+}
+
+RISK_EMOJI = {
+    "CRITICAL": "🔴",
+    "HIGH": "🟠",
+    "MEDIUM": "🟡",
+    "LOW": "🟢",
+}
+
+
+def parse_amount(value) -> float:
+    # The LLM can return any JSON value here; only strings are parsed
+    if not isinstance(value, str):
+        return 0.0
+    try:
+        return float(value.replace('$', '').replace(',', ''))
+    except ValueError:
+        return 0.0
+
+
+GEMINI_GENERATE_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={key}"
+GEMINI_STREAM_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:streamGenerateContent?alt=sse&key={key}"
+
+CLAIM_DETAILS_FALLBACK = {
+    "insurer": "Not found",
+    "claimant_name": "Not found",
+    "invoice_total": "Not found",
+    "incident": "Details not available",
+}
+
+
+@st.cache_resource
+def _http_session() -> requests.Session:
+    # Cached as a resource because Streamlit re-executes this script on every rerun
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    return session
+
+
+# Shared HTTP session so Gemini calls reuse pooled keep-alive connections
+_HTTP = _http_session()
+
+
+@st.cache_resource
+def _worker_pool() -> ThreadPoolExecutor:
+    # Long-lived like the HTTP session, so reruns don't spin up fresh threads
+    return ThreadPoolExecutor(max_workers=8)
+
+
+def gemini_generate(prompt: str, api_key: str) -> requests.Response:
+    return _HTTP.post(
+        GEMINI_GENERATE_URL.format(key=api_key),
+        headers={"Content-Type": "application/json"},
+        data=orjson.dumps({"contents": [{"parts": [{"text": prompt}]}]}),
+        timeout=(5, 30)  # (connect, read)
+    )
+
+
+def find_json_object(text: str):
+    """Return the first balanced {...} span in text, or None. Single linear pass."""
+    depth = 0
+    start = -1
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = depth > 0
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+    return None
+
+
+def hash_text(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _extract_claim_details(content_hash: str, _content: str, _api_key: str) -> dict:
+    """Ask Gemini for the headline claim fields; keyed on content_hash only."""
+    extract_prompt = f"""Extract the following information from this insurance claim document. Return ONLY a JSON object with these exact fields:
+{{
+    "insurer": "insurance company name",
+    "claimant_name": "name of the person making the claim",
+    "invoice_total": "total amount (include currency symbol)",
+    "incident": "brief one-line description of the incident (max 80 characters)"
+}}
+
+Document content:
+{_content}
+
+Return ONLY the JSON object, no other text."""
+    response = gemini_generate(extract_prompt, _api_key)
+    response.raise_for_status()
+    result_text = orjson.loads(response.content)['candidates'][0]['content']['parts'][0]['text']
+    # Extract JSON object
+    json_text = find_json_object(result_text)
+    if json_text:
+        return orjson.loads(json_text)
+    return dict(CLAIM_DETAILS_FALLBACK)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _summarize_document(content_hash: str, _chunk_sample: str, _api_key: str) -> str:
+    """Ask Gemini for a short executive summary; keyed on content_hash only."""
+    summary_prompt = f"""Provide a concise executive summary of the following insurance claim document.
+Highlight the claim context, key financial figures, notable parties, and any discrepancies.
+Keep the summary under 120 words.
+
+Document excerpt:
+{_chunk_sample}
+"""
+    response = gemini_generate(summary_prompt, _api_key)
+    response.raise_for_status()
+    return orjson.loads(response.content)["candidates"][0]["content"]["parts"][0]["text"]
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _network_analysis(claim_data: dict) -> dict:
+    """Network analysis keyed on the claim data, so reruns reuse the same result."""
+    return compute_network_analysis(claim_data)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _photo_analysis(image_bytes: bytes) -> dict:
+    """Deepfake checks keyed on the image bytes."""
+    return detect_photo_manipulation(image_bytes)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _build_report(report_key: tuple, _result: dict) -> str:
+    """Render the report body from SUMMARY down; keyed on report_key only."""
+    result = _result
+    agent_results = result.get("agent_results", {})
+    indicators = result.get("indicators", [])
+    indicator_lines = "\n".join(
+        f"[{ind.get('severity', 'unknown').upper()}] {ind.get('description', 'No description')}"
+        for ind in indicators
+    )
+    return f"""SUMMARY
+=======
+Fraud Score: {result.get('fraud_score', 0):.1%}
+Risk Level: {result.get('risk_level', 'unknown').upper()}
+Recommendation: {result.get('recommendation', 'unknown').upper()}
+Total Indicators: {result.get('total_indicators', 0)}
+Processing Time: {result.get('metadata', {}).get('processing_time_seconds', 0):.1f}s
+
+{result.get('summary', '')}
+
+AGENT RESULTS
+=============
+
+Document Extraction Agent:
+- Pages: {agent_results.get('document_extraction', {}).get('pages', 0)}
+- Content: {agent_results.get('document_extraction', {}).get('content_length', 0):,} characters
+- Indicators: {agent_results.get('document_extraction', {}).get('indicators', 0)}
+
+Inconsistency Detection Agent:
+- Inconsistencies: {agent_results.get('inconsistency_detection', {}).get('inconsistencies_found', 0)}
+- Confidence: {agent_results.get('inconsistency_detection', {}).get('confidence', 0):.1%}
+
+Pattern Matching Agent:
+- Patterns: {agent_results.get('pattern_matching', {}).get('patterns_detected', 0)}
+- Confidence: {agent_results.get('pattern_matching', {}).get('confidence', 0):.1%}
+
+FRAUD INDICATORS
+================
+{indicator_lines}
+
+==========================================
+Generated by ReconAI Multi-Agent System
+Landing AI ADE + Google Gemini 2.5 Flash
+==========================================
+"""
+
+
+SEVERITY_ORDER = ("critical", "high", "medium", "low", "other")
+
+SEV_COLOR = {
+    "critical": "#D32F2F",
+    "high": "#FF9800",
+    "medium": "#F57C00",
+    "low": "#4CAF50",
+}
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def group_indicators(indicator_rows: tuple) -> List[Tuple[str, list]]:
+    """Bucket (severity, type, description, confidence) rows into non-empty groups in render order."""
+    buckets = {severity: [] for severity in SEVERITY_ORDER}
+    for row in indicator_rows:
+        buckets.get(row[0], buckets["other"]).append(row)
+    return [(severity, buckets[severity]) for severity in SEVERITY_ORDER if buckets[severity]]
+
+
+# Jinja templates for the results page; block tags leave no blank lines behind,
+# which would otherwise end the markdown HTML block mid-template
+@st.cache_resource
+def _panel_template(source: str):
+    # Cached as a resource because Streamlit re-executes this script on every rerun
+    return Environment(trim_blocks=True, lstrip_blocks=True).from_string(source)
+
+
+# The four metric cards, rendered as one markdown element
+METRICS_PANEL = """\
+<div style='background: rgba(0,0,0,0.5); padding: 1.5rem; border-radius: 12px; 
+            border: 2px solid {{ color }}; margin-bottom: 1rem; text-align: center;'>
+    <p style='color: #B0B0B0; font-size: 0.85rem; margin: 0; text-transform: uppercase; letter-spacing: 1px;'>Fraud Score</p>
+    <h1 style='color: {{ color }}; font-size: 3rem; margin: 0.5rem 0; font-weight: 700;'>{{ "%.0f"|format(score) }}/100</h1>
+</div>
+<div style='background: rgba(0,0,0,0.5); padding: 1rem; border-radius: 12px; 
+            border: 1px solid {{ color }}; margin-bottom: 1rem; text-align: center;'>
+    <p style='color: #B0B0B0; font-size: 0.8rem; margin: 0; text-transform: uppercase;'>Risk Level</p>
+    <h3 style='color: {{ color }}; font-size: 1.5rem; margin: 0.5rem 0;'>{{ emoji }} {{ level }}</h3>
+</div>
+<div style='background: rgba(0,0,0,0.5); padding: 1rem; border-radius: 12px; 
+            border: 1px solid {{ color }}; margin-bottom: 1rem; text-align: center;'>
+    <p style='color: #B0B0B0; font-size: 0.8rem; margin: 0; text-transform: uppercase;'>Recommendation</p>
+    <h3 style='color: #F0F0F0; font-size: 1.2rem; margin: 0.5rem 0;'>{{ recommendation }}</h3>
+</div>
+<div style='background: rgba(0,0,0,0.5); padding: 1rem; border-radius: 12px; 
+            border: 1px solid {{ color }}; text-align: center;'>
+    <p style='color: #B0B0B0; font-size: 0.8rem; margin: 0; text-transform: uppercase;'>Total Indicators</p>
+    <h3 style='color: #F0F0F0; font-size: 1.5rem; margin: 0.5rem 0;'>{{ total }}</h3>
+</div>
+"""
+
+# Every severity group with its indicator cards, rendered as one markdown element
+INDICATORS_PANEL = """\
+<div>
+{% for severity, group in groups %}
+<p style='color: var(--secondary-light); font-weight: 600;'>{{ severity|upper }} Severity ({{ group|length }} indicators)</p>
+{% for _, ind_type, description, confidence in group %}
+<div style='margin-left: 1rem; padding: 0.5rem; border-left: 3px solid {{ colors.get(severity, "#78909C") }}; background-color: var(--near-black); margin-bottom: 0.5rem; border-radius: 4px;'>\
+<strong style='color: var(--secondary-light);'>{{ ind_type.replace('_', ' ').title() }}</strong><br>\
+<span style='color: var(--light-grey);'>{{ description }}</span> <em style='color: var(--light-grey);'>(Confidence: {{ "{:.0%}".format(confidence) }})</em>\
+</div>
+{% endfor %}
+{% endfor %}
+</div>
+"""
+
+DEEPFAKE_BANNER_HTML = """
+<div style='background: rgba(0, 122, 255, 0.15);
+            border-left: 4px solid #007AFF;
+            padding: 1rem;
+            border-radius: 8px;
+            margin-bottom: 1rem;'>
+    <strong>💡 Advanced Photo Analysis:</strong> Upload claim photos to analyze 
+    for AI-generation, digital manipulation, and metadata tampering. Our deepfake 
+    detector uses 5 independent algorithms to verify photo authenticity.
+</div>
+"""
+
+FOOTER_HTML = """
+<div style="margin-top: 3rem; padding: 1.5rem 0 1rem 0; border-top: 1px solid #333333; color: #E0E0E0; display: flex; justify-content: space-between; flex-wrap: wrap; gap: 1rem; font-size: 0.85rem;">
+    <div>Powered by Landing AI ADE + Gemini 2.5 Flash</div>
+    <div>
+        <a href="#" style="color: rgba(138, 180, 255, 0.95); text-decoration: none; margin-right: 1rem;">Privacy Policy</a>
+        <a href="#" style="color: rgba(138, 180, 255, 0.95); text-decoration: none; margin-right: 1rem;">Terms</a>
+        <a href="#" style="color: rgba(138, 180, 255, 0.95); text-decoration: none;">Contact</a>
+    </div>
+</div>
+"""
+
+
+def render_assistant_message(message: dict) -> str:
+    """Reasoning log and source pill of a chat reply as one HTML blob; the answer is rendered separately."""
+    parts = []
+
+    sub_queries = message.get("reasoning_log", {}).get("sub_queries", [])
+    if sub_queries:
+        items = "".join(
+            f"<p><strong>{i}.</strong> {html.escape(sq)}</p>" for i, sq in enumerate(sub_queries, 1)
+        )
+        parts.append(f"<details><summary>▸ Analyzed via {len(sub_queries)} queries</summary>{items}</details>")
+
+    if message.get("citations"):
+        first_citation = message["citations"][0]
+        parts.append("**📄 Source:**")
+        parts.append(
+            f'<div style="background: var(--dark-bg); padding: 0.3rem 0.6rem; '
+            f'border-radius: 12px; font-size: 0.8rem; display: inline-flex; '
+            f'border: 1px solid var(--secondary-light); max-width: 200px; '
+            f'justify-content: center;">'
+            f'{html.escape(first_citation.get("document", "doc"))}</div>'
+        )
+    return "\n\n".join(parts)
 
 
 # Initialize directory-related session state values
@@ -182,7 +701,9 @@ def render_dataroom_panel(context: str, allow_open: bool = True):
                     st.warning("Please provide a name for the directory.")
                 else:
                     slug = slugify(new_name)
-                    if dataroom_path(slug).exists():
+                    try:
+                        _create_dataroom(slug)
+                    except FileExistsError:
                         st.warning("A directory with this name already exists.")
                     else:
                         save_dataroom_snapshot(slug, new_name.strip())
@@ -207,12 +728,8 @@ def render_dataroom_panel(context: str, allow_open: bool = True):
             for rec in dataroom_records
         ]
         slug_map = {label: rec["slug"] for label, rec in zip(labels, dataroom_records)}
-        default_index = 0
-        if current_slug:
-            for idx, rec in enumerate(dataroom_records):
-                if rec["slug"] == current_slug:
-                    default_index = idx
-                    break
+        slug_index = {rec["slug"]: (idx, rec) for idx, rec in enumerate(dataroom_records)}
+        default_index = slug_index.get(current_slug, (0, None))[0]
         selection_label = st.radio(
             "Existing directories",
             labels,
@@ -221,10 +738,7 @@ def render_dataroom_panel(context: str, allow_open: bool = True):
             label_visibility="collapsed",
         )
         selected_slug = slug_map[selection_label]
-        selected_record = next(
-            (rec for rec in dataroom_records if rec["slug"] == selected_slug),
-            None,
-        )
+        selected_record = slug_index.get(selected_slug, (0, None))[1]
         display_record = selected_record or {
             "name": selected_slug,
             "updated_at": None,
@@ -553,12 +1067,13 @@ if uploaded_file:
     analyze_button_disabled = already_analyzed
     if st.button("Start Analysis", type="primary", use_container_width=True, disabled=analyze_button_disabled):
         # Clear cached results from previous analysis
-        for key in ['claim_details', 'document_summary', 'fraud_narrative']:
+        for key in ['claim_details', 'document_summary', 'fraud_narrative', 'narrative_future']:
             if key in st.session_state:
                 del st.session_state[key]
         
         with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
+            uploaded_file.seek(0)
+            shutil.copyfileobj(uploaded_file, tmp_file, length=1024 * 1024)
             pdf_path = tmp_file.name
 
         try:
@@ -597,14 +1112,12 @@ if uploaded_file:
 
             async def run_analysis_with_updates():
                 analysis_task = asyncio.create_task(orchestrator.analyze_claim(pdf_path))
-                spinner_cycle = cycle(["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"])
-                message_cycle = cycle(status_messages)
-                keyword_cycle = cycle(analysis_tokens)
-                current_message = next(message_cycle)
-                current_keyword = next(keyword_cycle)
                 step = 0
                 while not analysis_task.done():
-                    spinner = next(spinner_cycle)
+                    spinner = SPINNER[step % len(SPINNER)]
+                    # Message and keyword advance every fourth tick
+                    current_message = status_messages[(step // 4) % len(status_messages)]
+                    current_keyword = analysis_tokens[(step // 4) % len(analysis_tokens)]
                     dots = "." * ((step % 3) + 1)
                     status_text.markdown(
                         f"<p style='color: #8ab4ff; font-weight: 600;'>{spinner} {current_message}"
@@ -613,10 +1126,8 @@ if uploaded_file:
                     )
                     progress_bar.progress(min(90, 10 + (step % len(status_messages)) * 10))
                     step += 1
-                    if step % 4 == 0:
-                        current_message = next(message_cycle)
-                        current_keyword = next(keyword_cycle)
-                    await asyncio.sleep(0.6)
+                    # Returns as soon as the analysis finishes instead of after a full tick
+                    await asyncio.wait({analysis_task}, timeout=0.6)
                 progress_bar.progress(95)
                 return await analysis_task
 
@@ -632,45 +1143,19 @@ if uploaded_file:
             # Store document content and chunks in session state for RAG chat
             agent_results = result.get("agent_results", {})
             doc_extraction = agent_results.get("document_extraction", {})
-            st.session_state.document_content = doc_extraction.get("markdown", "")
-
-            raw_chunks = doc_extraction.get("chunks", [])
-            processed_chunks: List[str] = []
-
-            if isinstance(raw_chunks, list):
-                for chunk in raw_chunks:
-                    if isinstance(chunk, dict):
-                        text_value = chunk.get("text") or chunk.get("content") or chunk.get("markdown")
-                        if text_value:
-                            processed_chunks.append(str(text_value))
-                    elif isinstance(chunk, str):
-                        processed_chunks.append(chunk)
-                    else:
-                        processed_chunks.append(str(chunk))
-            elif isinstance(raw_chunks, str):
-                processed_chunks.append(raw_chunks)
-
-            if not processed_chunks:
-                splits = doc_extraction.get("splits", [])
-                if isinstance(splits, list):
-                    for split in splits:
-                        if isinstance(split, dict):
-                            text_value = split.get("text") or split.get("content")
-                            if text_value:
-                                processed_chunks.append(str(text_value))
-                        elif isinstance(split, str):
-                            processed_chunks.append(split)
-
-            if not processed_chunks:
-                markdown_fallback = st.session_state.document_content or ""
-                if markdown_fallback:
-                    processed_chunks = [
-                        markdown_fallback[i : i + 1200]
-                        for i in range(0, len(markdown_fallback), 1200)
-                    ]
+            full_markdown = doc_extraction.get("markdown", "") or ""
+            st.session_state.document_content = full_markdown[:DOCUMENT_CONTENT_LIMIT]
+            st.session_state.document_content_head = full_markdown[:5000]
+
+            # Overlapping parser outputs can repeat chunks; keep first occurrences in order
+            processed_chunks = list(dict.fromkeys(iter_chunks(doc_extraction)))
+            if not processed_chunks and full_markdown:
+                # Window the capped copy so session state doesn't pin the full text
+                processed_chunks = LazyChunks(st.session_state.document_content, 1200)
 
             st.session_state.document_chunks = processed_chunks
-            st.session_state.full_result = result  # Store full analysis result
+            chunk_index_for(processed_chunks)
+            st.session_state.full_result = slim_result(result)  # Store analysis result minus raw payloads
             st.session_state.analysis_complete = True  # Flag to persist results view
             st.session_state.filename = uploaded_file.name  # Store filename
             st.session_state.last_analyzed_file = f"{uploaded_file.name}_{uploaded_file.size}"  # Prevent re-analysis
@@ -679,6 +1164,7 @@ if uploaded_file:
                 st.session_state.get("selected_dataroom")
                 and st.session_state.get("selected_dataroom_name")
             ):
+                save_dataroom_document(st.session_state["selected_dataroom"], full_markdown)
                 save_dataroom_snapshot(
                     st.session_state["selected_dataroom"],
                     st.session_state["selected_dataroom_name"],
@@ -686,7 +1172,6 @@ if uploaded_file:
 
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
-            import traceback
             with st.expander("Error Details"):
                 st.code(traceback.format_exc())
             if 'status_text' in locals():
@@ -697,8 +1182,12 @@ if uploaded_file:
                 os.unlink(pdf_path)
 
 # Display Results (outside the button block, but check session state)
-if "analysis_complete" in st.session_state and st.session_state.analysis_complete:
-    result = st.session_state.full_result
+# Every st.session_state access goes through Streamlit's proxy; bind it once for the page below
+ss = st.session_state
+
+if "analysis_complete" in ss and ss.analysis_complete:
+    result = ss.full_result
+    filename = ss.get("filename", "Unknown")
 
     # Continue with results display
     st.markdown("---")
@@ -711,119 +1200,55 @@ if "analysis_complete" in st.session_state and st.session_state.analysis_complet
     total_indicators = result.get("total_indicators", 0)
     processing_time = result.get("metadata", {}).get("processing_time_seconds", 0)
 
-    risk_color = {
-        "CRITICAL": "#D32F2F",
-        "HIGH": "#FF9800",
-        "MEDIUM": "#F57C00",
-        "LOW": "#4CAF50"
-    }.get(risk_level, "#78909C")
-
-    # Extract claim details if not already in session state
-    if "claim_details" not in st.session_state:
-        with st.spinner("Extracting claim details..."):
-            try:
-                document_content = st.session_state.get("document_content", "")
-
-                extract_prompt = f"""Extract the following information from this insurance claim document. Return ONLY a JSON object with these exact fields:
-{{
-    "insurer": "insurance company name",
-    "claimant_name": "name of the person making the claim",
-    "invoice_total": "total amount (include currency symbol)",
-    "incident": "brief one-line description of the incident (max 80 characters)"
-}}
-
-Document content:
-{document_content[:5000]}
+    risk_color = RISK_COLORS.get(risk_level, "#78909C")
 
-Return ONLY the JSON object, no other text."""
+    document_content = ss.get("document_content", "")
 
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={gemini_key}"
-                response = requests.post(
-                    url,
-                    headers={"Content-Type": "application/json"},
-                    json={"contents": [{"parts": [{"text": extract_prompt}]}]},
-                    timeout=30
-                )
-
-                if response.status_code == 200:
-                    import json
-                    import re
-                    result_text = response.json()['candidates'][0]['content']['parts'][0]['text']
-                    # Extract JSON object
-                    json_match = re.search(r'\{.*?\}', result_text, re.DOTALL)
-                    if json_match:
-                        st.session_state.claim_details = json.loads(json_match.group())
-                    else:
-                        st.session_state.claim_details = {
-                            "insurer": "Not found",
-                            "claimant_name": "Not found",
-                            "invoice_total": "Not found",
-                            "incident": "Details not available"
-                        }
-                else:
-                    st.session_state.claim_details = {
-                        "insurer": "Not found",
-                        "claimant_name": "Not found",
-                        "invoice_total": "Not found",
-                        "incident": "Details not available"
-                    }
-            except Exception as e:
-                st.session_state.claim_details = {
-                    "insurer": "Not found",
-                    "claimant_name": "Not found",
-                    "invoice_total": "Not found",
-                    "incident": "Details not available"
-                }
-
-    claim_details = st.session_state.get("claim_details", {})
-
-    chunk_texts = st.session_state.get("document_chunks") or []
+    chunk_texts = ss.get("document_chunks") or []
     if not chunk_texts:
-        fallback_markdown = st.session_state.get("document_content", "")
+        fallback_markdown = document_content
         if fallback_markdown:
             chunk_texts = [fallback_markdown[:4000]]
 
-    # Cache document summary to avoid regenerating on every rerun
-    if "document_summary" not in st.session_state:
-        with st.spinner("Summarizing document..."):
-            try:
-                chunk_sample = "\n\n".join(chunk_texts[:5])[:4000]
-                summary_prompt = f"""Provide a concise executive summary of the following insurance claim document.
-Highlight the claim context, key financial figures, notable parties, and any discrepancies.
-Keep the summary under 120 words.
+    # Claim details and the document summary are independent of each other, so
+    # fetch whichever are missing concurrently. Both calls are st.cache_data'd on
+    # a hash of their input, so a rerun that interrupts them never re-POSTs.
+    # Nothing to send when extraction produced no text; skip the round trip.
+    claim_future = summary_future = None
+    if "claim_details" not in ss:
+        extract_content = document_content[:5000]
+        if not extract_content.strip():
+            ss.claim_details = dict(CLAIM_DETAILS_FALLBACK)
+        else:
+            claim_future = _worker_pool().submit(
+                _extract_claim_details, hash_text(extract_content), extract_content, gemini_key
+            )
+    if "document_summary" not in ss:
+        chunk_sample = "\n\n".join(chunk_texts[:5])[:4000]
+        if not chunk_sample.strip():
+            ss.document_summary = "No document content available for summary."
+        else:
+            summary_future = _worker_pool().submit(
+                _summarize_document, hash_text(chunk_sample), chunk_sample, gemini_key
+            )
 
-Document excerpt:
-{chunk_sample}
-"""
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={gemini_key}"
-                response = requests.post(
-                    url,
-                    headers={"Content-Type": "application/json"},
-                    json={"contents": [{"parts": [{"text": summary_prompt}]}]},
-                    timeout=30
-                )
-                if response.status_code == 200:
-                    st.session_state.document_summary = response.json()["candidates"][0]["content"]["parts"][0]["text"]
-                else:
-                    st.session_state.document_summary = "Unable to generate summary."
-            except Exception as e:
-                st.session_state.document_summary = "Summary unavailable. Please review document details below."
-    
-    summary_text = st.session_state.document_summary
+    # The narrative only needs the claim details, so collect those first and
+    # start it while the summary is still in flight
+    if claim_future is not None:
+        with st.spinner("Extracting claim details..."):
+            try:
+                ss.claim_details = claim_future.result()
+            except Exception:
+                ss.claim_details = dict(CLAIM_DETAILS_FALLBACK)
 
-    # ========== NEW LAYOUT: Executive Summary on left, Metrics on right ==========
     # Prepare claim data for fraud story
-    claim_details_for_story = st.session_state.get('claim_details', {})
+    claim_details_for_story = ss.get('claim_details', {})
     
     # Extract claimed amount
-    invoice_total_str = claim_details_for_story.get('invoice_total', '$0')
-    try:
-        claimed_amount_story = float(invoice_total_str.replace('$', '').replace(',', ''))
-    except:
-        claimed_amount_story = 0.0
+    claimed_amount_story = parse_amount(claim_details_for_story.get('invoice_total', '$0'))
     
     fraud_story_claim_data = {
-        'claim_id': st.session_state.get('filename', 'Unknown'),
+        'claim_id': filename,
         'claimant': {'name': claim_details_for_story.get('claimant_name', 'Unknown Claimant')},
         'incident_date': datetime.now().strftime('%B %d, %Y'),
         'claimed_amount': claimed_amount_story,
@@ -832,18 +1257,58 @@ Document excerpt:
     
     # Get indicators from result
     indicators_for_story = result.get('indicators', [])
+
+    # Start the narrative call in the background; the summary column collects it.
+    # The future is tagged with its inputs so a stale one is never consumed.
+    narrative_key = hashlib.blake2b(
+        orjson.dumps(
+            [fraud_story_claim_data, indicators_for_story],
+            option=orjson.OPT_SORT_KEYS,
+            default=str,
+        ),
+        digest_size=16,
+    ).hexdigest()
+    pending_narrative = ss.get("narrative_future")
+    if (
+        indicators_for_story
+        and "fraud_narrative" not in ss
+        and (pending_narrative is None or pending_narrative[0] != narrative_key)
+    ):
+        ss.narrative_future = (
+            narrative_key,
+            prefetch_narrative(fraud_story_claim_data, indicators_for_story, gemini_key),
+        )
+
+    if summary_future is not None:
+        with st.spinner("Summarizing document..."):
+            try:
+                ss.document_summary = summary_future.result()
+            except requests.HTTPError:
+                ss.document_summary = "Unable to generate summary."
+            except Exception:
+                ss.document_summary = "Summary unavailable. Please review document details below."
     
+    summary_text = ss.document_summary
+
+    # ========== NEW LAYOUT: Executive Summary on left, Metrics on right ==========
     summary_col, metrics_col = st.columns([2, 1])
     
     with summary_col:
         # Display Executive Summary in Document Summary style
         if indicators_for_story:
             # Cache fraud narrative to avoid regenerating on every rerun
-            if "fraud_narrative" not in st.session_state:
+            if "fraud_narrative" not in ss:
                 with st.spinner("🔍 Analyzing evidence and reconstructing fraud timeline..."):
-                    st.session_state.fraud_narrative = generate_fraud_narrative(fraud_story_claim_data, indicators_for_story, gemini_key)
+                    # Leave the future in place until its result is stored, so a rerun
+                    # that interrupts the wait picks it up again instead of re-POSTing
+                    pending_narrative = ss.get("narrative_future")
+                    if pending_narrative is not None and pending_narrative[0] == narrative_key:
+                        ss.fraud_narrative, _ = resolve_narrative(pending_narrative[1], fraud_story_claim_data, indicators_for_story)
+                    else:
+                        ss.fraud_narrative, _ = generate_fraud_narrative(fraud_story_claim_data, indicators_for_story, gemini_key)
+                    ss.pop("narrative_future", None)
             
-            narrative = st.session_state.fraud_narrative
+            narrative = ss.fraud_narrative
             # Format narrative
             formatted_narrative = format_narrative_for_display(narrative)
             
@@ -873,52 +1338,19 @@ Document excerpt:
             """, unsafe_allow_html=True)
     
     with metrics_col:
-        # Fraud Score - Large display
         fraud_score_metric = result.get("fraud_score", 0) * 100
-        st.markdown(f"""
-        <div style='background: rgba(0,0,0,0.5); padding: 1.5rem; border-radius: 12px; 
-                    border: 2px solid {risk_color}; margin-bottom: 1rem; text-align: center;'>
-            <p style='color: #B0B0B0; font-size: 0.85rem; margin: 0; text-transform: uppercase; letter-spacing: 1px;'>Fraud Score</p>
-            <h1 style='color: {risk_color}; font-size: 3rem; margin: 0.5rem 0; font-weight: 700;'>{fraud_score_metric:.0f}/100</h1>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Risk Level
         risk_level_metric = result.get("risk_level", "unknown").upper()
-        risk_emoji = {
-            "CRITICAL": "🔴",
-            "HIGH": "🟠",
-            "MEDIUM": "🟡",
-            "LOW": "🟢"
-        }.get(risk_level_metric, '⚪')
-        
-        st.markdown(f"""
-        <div style='background: rgba(0,0,0,0.5); padding: 1rem; border-radius: 12px; 
-                    border: 1px solid {risk_color}; margin-bottom: 1rem; text-align: center;'>
-            <p style='color: #B0B0B0; font-size: 0.8rem; margin: 0; text-transform: uppercase;'>Risk Level</p>
-            <h3 style='color: {risk_color}; font-size: 1.5rem; margin: 0.5rem 0;'>{risk_emoji} {risk_level_metric}</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Recommendation
-        recommendation_metric = result.get("recommendation", "unknown").upper()
-        st.markdown(f"""
-        <div style='background: rgba(0,0,0,0.5); padding: 1rem; border-radius: 12px; 
-                    border: 1px solid {risk_color}; margin-bottom: 1rem; text-align: center;'>
-            <p style='color: #B0B0B0; font-size: 0.8rem; margin: 0; text-transform: uppercase;'>Recommendation</p>
-            <h3 style='color: #F0F0F0; font-size: 1.2rem; margin: 0.5rem 0;'>{recommendation_metric}</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Total Indicators
-        total_indicators_metric = result.get("total_indicators", 0)
-        st.markdown(f"""
-        <div style='background: rgba(0,0,0,0.5); padding: 1rem; border-radius: 12px; 
-                    border: 1px solid {risk_color}; text-align: center;'>
-            <p style='color: #B0B0B0; font-size: 0.8rem; margin: 0; text-transform: uppercase;'>Total Indicators</p>
-            <h3 style='color: #F0F0F0; font-size: 1.5rem; margin: 0.5rem 0;'>{total_indicators_metric}</h3>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(
+            _panel_template(METRICS_PANEL).render(
+                color=risk_color,
+                score=fraud_score_metric,
+                emoji=RISK_EMOJI.get(risk_level_metric, '⚪'),
+                level=risk_level_metric,
+                recommendation=result.get("recommendation", "unknown").upper(),
+                total=result.get("total_indicators", 0),
+            ),
+            unsafe_allow_html=True,
+        )
 
     agent_results = result.get("agent_results", {})
 
@@ -930,11 +1362,13 @@ Document excerpt:
         'claimant': {'name': claim_details_for_story.get('claimant_name', 'Unknown Claimant')},
         'claimed_amount': claimed_amount_story,
         'incident_type': claim_details_for_story.get('incident', 'insurance claim'),
-        'claim_id': st.session_state.get('filename', 'Unknown')
+        'claim_id': filename
     }
     
     # Display network analysis
-    display_network_analysis(network_claim_data)
+    with st.spinner("🕸️ Analyzing fraud collaboration network..."):
+        network_results = _network_analysis(network_claim_data)
+    render_network_analysis(network_results)
 
     # All Indicators
     st.markdown("---")
@@ -943,30 +1377,19 @@ Document excerpt:
     indicators = result.get("indicators", [])
 
     if indicators:
-        # Group by severity
-        severity_groups = {
-            "critical": [],
-            "high": [],
-            "medium": [],
-            "low": []
-        }
-
-        for ind in indicators:
-            severity = ind.get("severity", "medium")
-            severity_groups[severity].append(ind)
-
-        for severity in ["critical", "high", "medium", "low"]:
-            group = severity_groups[severity]
-            if group:
-                st.markdown(f"<p style='color: var(--secondary-light); font-weight: 600;'>{severity.upper()} Severity ({len(group)} indicators)</p>", unsafe_allow_html=True)
-
-                for ind in group:
-                    st.markdown(f"""
-                    <div style='margin-left: 1rem; padding: 0.5rem; border-left: 3px solid {"#D32F2F" if severity == "critical" else "#FF9800" if severity == "high" else "#F57C00" if severity == "medium" else "#4CAF50"}; background-color: var(--near-black); margin-bottom: 0.5rem; border-radius: 4px;'>
-                        <strong style='color: var(--secondary-light);'>{ind.get('type', 'unknown').replace('_', ' ').title()}</strong><br>
-                        <span style='color: var(--light-grey);'>{ind.get('description', 'No description')}</span> <em style='color: var(--light-grey);'>(Confidence: {ind.get('confidence', 0):.0%})</em>
-                    </div>
-                    """, unsafe_allow_html=True)
+        indicator_rows = tuple(
+            (
+                ind.get("severity", "medium"),
+                ind.get("type", "unknown"),
+                ind.get("description", "No description"),
+                ind.get("confidence", 0),
+            )
+            for ind in indicators
+        )
+        st.markdown(
+            _panel_template(INDICATORS_PANEL).render(groups=group_indicators(indicator_rows), colors=SEV_COLOR),
+            unsafe_allow_html=True,
+        )
     else:
         st.info("✓ No significant fraud indicators detected")
 
@@ -974,17 +1397,7 @@ Document excerpt:
     st.markdown("---")
     st.markdown("### 🤖 Photo Authenticity Analysis")
     
-    st.markdown("""
-    <div style='background: rgba(0, 122, 255, 0.15);
-                border-left: 4px solid #007AFF;
-                padding: 1rem;
-                border-radius: 8px;
-                margin-bottom: 1rem;'>
-        <strong>💡 Advanced Photo Analysis:</strong> Upload claim photos to analyze 
-        for AI-generation, digital manipulation, and metadata tampering. Our deepfake 
-        detector uses 5 independent algorithms to verify photo authenticity.
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(DEEPFAKE_BANNER_HTML, unsafe_allow_html=True)
     
     # Add file uploader for photos
     photo_uploader = st.file_uploader(
@@ -997,18 +1410,10 @@ Document excerpt:
     
     if photo_uploader:
         for uploaded_photo in photo_uploader:
-            # Save temporarily
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                tmp_file.write(uploaded_photo.getvalue())
-                temp_image_path = tmp_file.name
-            
-            # Analyze photo
-            display_deepfake_analysis(temp_image_path, uploaded_photo.name)
-            
-            # Cleanup
-            import os
-            os.unlink(temp_image_path)
+            image_bytes = uploaded_photo.getvalue()
+            with st.spinner("🔍 Analyzing photo for manipulation..."):
+                photo_results = _photo_analysis(image_bytes)
+            render_deepfake_analysis(image_bytes, uploaded_photo.name, photo_results)
             
             st.markdown("---")
 
@@ -1069,55 +1474,40 @@ Document excerpt:
         st.markdown(f"**Agents Used**: {', '.join(metadata.get('agents_used', []))}")
 
     # Download Report
-    report = f"""
+    # The body only changes with the analysis result; just the header is per build
+    report_key = (
+        result.get("fraud_score", 0),
+        result.get("total_indicators", 0),
+        result.get("metadata", {}).get("timestamp"),
+    )
+    # Reports are built on request and kept until the analysis or document changes
+    prepared = ss.get("prepared_report")
+    if prepared is None or prepared["key"] != (report_key, filename):
+        prepared = None
+        if st.button("Prepare Report", use_container_width=True):
+            # One clock read so the report header and the file name agree
+            now = datetime.now()
+            report = f"""
 RECONAI MULTI-AGENT FRAUD ANALYSIS REPORT
 ==========================================
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Document: {st.session_state.get("filename", "Unknown")}
-
-SUMMARY
-=======
-Fraud Score: {result.get('fraud_score', 0):.1%}
-Risk Level: {result.get('risk_level', 'unknown').upper()}
-Recommendation: {result.get('recommendation', 'unknown').upper()}
-Total Indicators: {result.get('total_indicators', 0)}
-Processing Time: {result.get('metadata', {}).get('processing_time_seconds', 0):.1f}s
-
-{result.get('summary', '')}
-
-AGENT RESULTS
-=============
-
-Document Extraction Agent:
-- Pages: {agent_results.get('document_extraction', {}).get('pages', 0)}
-- Content: {agent_results.get('document_extraction', {}).get('content_length', 0):,} characters
-- Indicators: {agent_results.get('document_extraction', {}).get('indicators', 0)}
-
-Inconsistency Detection Agent:
-- Inconsistencies: {agent_results.get('inconsistency_detection', {}).get('inconsistencies_found', 0)}
-- Confidence: {agent_results.get('inconsistency_detection', {}).get('confidence', 0):.1%}
-
-Pattern Matching Agent:
-- Patterns: {agent_results.get('pattern_matching', {}).get('patterns_detected', 0)}
-- Confidence: {agent_results.get('pattern_matching', {}).get('confidence', 0):.1%}
-
-FRAUD INDICATORS
-================
-{chr(10).join([f"[{ind.get('severity', 'unknown').upper()}] {ind.get('description', 'No description')}" for ind in indicators])}
-
-==========================================
-Generated by ReconAI Multi-Agent System
-Landing AI ADE + Google Gemini 2.5 Flash
-==========================================
-"""
+Generated: {now.strftime('%Y-%m-%d %H:%M:%S')}
+Document: {filename}
+
+""" + _build_report(report_key, result)
+            prepared = ss.prepared_report = {
+                "key": (report_key, filename),
+                "report": report,
+                "file_name": f"reconai_report_{now.strftime('%Y%m%d_%H%M%S')}.txt",
+            }
 
-    st.download_button(
-        "Download Full Report",
-        report,
-        f"reconai_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-        "text/plain",
-        use_container_width=True
-    )
+    if prepared is not None:
+        st.download_button(
+            "Download Full Report",
+            prepared["report"],
+            prepared["file_name"],
+            "text/plain",
+            use_container_width=True
+        )
     
     # Chat interface moved outside this block to persist after deepfake uploads
 
@@ -1128,49 +1518,34 @@ st.markdown("<h3 style='color: var(--secondary-light);'>💬 Ask Questions About
 st.markdown("<p style='color: var(--light-grey); margin-bottom: 1rem;'>Advanced document analysis with multi-query retrieval and citations</p>", unsafe_allow_html=True)
 
 # Check if document is available
-if "document_content" not in st.session_state or not st.session_state.document_content:
+if "document_content" not in ss or not ss.document_content:
     st.info("💡 Upload and analyze a claim document to enable the chat feature.")
 else:
     # Initialize chat history
-    if "chat_messages" not in st.session_state:
-        st.session_state.chat_messages = []
+    if "chat_messages" not in ss:
+        ss.chat_messages = []
+    chat_messages = ss.chat_messages
 
     # Display existing chat history
-    for msg_idx, message in enumerate(st.session_state.chat_messages):
+    for msg_idx, message in enumerate(chat_messages):
         with st.chat_message(message["role"]):
             if message["role"] == "user":
                 st.markdown(message["content"])
             else:
-                # Display answer text
+                # Plain markdown, no HTML: the answer is model output
                 st.markdown(message["content"])
 
-                # Display reasoning log (collapsible)
-                if "reasoning_log" in message:
-                    reasoning = message["reasoning_log"]
-                    sub_queries = reasoning.get("sub_queries", [])
-                    if sub_queries:
-                        with st.expander(f"▸ Analyzed via {len(sub_queries)} queries"):
-                            for i, sq in enumerate(sub_queries, 1):
-                                st.markdown(f"**{i}.** {sq}")
-
-                # Display citations (source pills)
-                if "citations" in message and message["citations"]:
-                    st.markdown("**📄 Source:**")
-                    first_citation = message["citations"][0]
-                    st.markdown(
-                        f'<div style="background: var(--dark-bg); padding: 0.3rem 0.6rem; '
-                        f'border-radius: 12px; font-size: 0.8rem; display: inline-flex; '
-                        f'border: 1px solid var(--secondary-light); max-width: 200px; '
-                        f'justify-content: center;">'
-                        f'{first_citation.get("document", "doc")}</div>',
-                        unsafe_allow_html=True
-                    )
+                # Answered messages never change, so their extra markup is built once and kept
+                if "_rendered_html" not in message:
+                    message["_rendered_html"] = render_assistant_message(message)
+                if message["_rendered_html"]:
+                    st.markdown(message["_rendered_html"], unsafe_allow_html=True)
 
     # Chat input using form placeholder to avoid duplicate rendering during processing
     chat_form_placeholder = st.empty()
     status_placeholder = st.empty()
 
-    with chat_form_placeholder.form(key=f"chat_form_{len(st.session_state.chat_messages)}", clear_on_submit=True):
+    with chat_form_placeholder.form(key=f"chat_form_{len(chat_messages)}", clear_on_submit=True):
         user_question = st.text_input(
             "Your question:",
             placeholder="e.g., What's the invoice total?, What is the claimant address?",
@@ -1180,26 +1555,38 @@ else:
 
     if submit_button and user_question:
         # Add user message
-        st.session_state.chat_messages.append({"role": "user", "content": user_question})
+        chat_messages.append({"role": "user", "content": user_question})
 
         # Remove the form while processing to prevent duplicate UI
         chat_form_placeholder.empty()
 
         # Process with RAG system
         try:
-            def call_gemini(prompt_text: str, base_message: str):
-                url_local = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={gemini_key}"
+            def call_gemini(prompt_text: str, base_message: str) -> str:
                 status_placeholder.markdown(
                     f"<p style='color: #8ab4ff; font-weight: 600;'>⏳ {base_message}...</p>",
                     unsafe_allow_html=True,
                 )
-                response_local = requests.post(
-                    url_local,
+                # Stream server-sent events so the answer renders as it is generated
+                with _HTTP.post(
+                    GEMINI_STREAM_URL.format(key=gemini_key),
                     headers={"Content-Type": "application/json"},
-                    json={"contents": [{"parts": [{"text": prompt_text}]}]},
+                    data=orjson.dumps({"contents": [{"parts": [{"text": prompt_text}]}]}),
+                    stream=True,
                     timeout=30
-                )
-                return response_local
+                ) as response_local:
+                    if response_local.status_code != 200:
+                        raise Exception(f"API returned {response_local.status_code}")
+                    partial = ""
+                    for line in response_local.iter_lines():
+                        if not line.startswith(b"data:"):
+                            continue
+                        event = orjson.loads(line[5:])
+                        for candidate in event.get("candidates", [])[:1]:
+                            for part in candidate.get("content", {}).get("parts", []):
+                                partial += part.get("text", "")
+                        status_placeholder.markdown(partial)
+                return partial
 
             # Step 1: Retrieve relevant chunks (simple keyword filtering)
             status_placeholder.markdown(
@@ -1207,18 +1594,27 @@ else:
                 unsafe_allow_html=True,
             )
             sub_queries = [user_question]
-            chunks = st.session_state.document_chunks if isinstance(st.session_state.get("document_chunks"), list) else []
+            chunks = ss.get("document_chunks")
+            if not isinstance(chunks, Sequence) or isinstance(chunks, str):
+                chunks = []
+            chunk_index = chunk_index_for(chunks)
             retrieved_chunks = []
             for sq_idx, sq in enumerate(sub_queries):
-                keywords = sq.lower().split()
-                for chunk_idx, chunk in enumerate(chunks[:20]):  # Limit to first 20 chunks
-                    chunk_text = str(chunk).lower()
-                    if any(kw in chunk_text for kw in keywords):
-                        retrieved_chunks.append({
-                            "sub_query": sq,
-                            "chunk_index": chunk_idx,
-                            "content": str(chunk)[:500]
-                        })
+                # Repeated words in the question would only repeat the same lookups
+                keywords = set(_TOKEN_RE.findall(sq.lower()))
+                candidate_ids = frozenset().union(*(chunk_index.get(kw, ()) for kw in keywords))
+                for chunk_idx in sorted(candidate_ids):
+                    if chunk_idx >= len(chunks):
+                        break
+                    retrieved_chunks.append({
+                        "sub_query": sq,
+                        "chunk_index": chunk_idx,
+                        "content": str(chunks[chunk_idx])[:500]
+                    })
+                    if len(retrieved_chunks) >= RETRIEVED_CHUNK_LIMIT:
+                        break
+                if len(retrieved_chunks) >= RETRIEVED_CHUNK_LIMIT:
+                    break
 
             if not retrieved_chunks and chunks:
                 for idx, chunk in enumerate(chunks[:3]):
@@ -1229,7 +1625,7 @@ else:
                     })
 
             # Step 2: Extract structured data from result
-            full_result = st.session_state.full_result
+            full_result = ss.full_result
             structured_data = {
                 "fraud_score": full_result.get("fraud_score", 0),
                 "risk_level": full_result.get("risk_level", "unknown"),
@@ -1238,6 +1634,10 @@ else:
             }
 
             # Step 3: Synthesize answer with Gemini
+            document_head = ss.get("document_content_head")
+            if document_head is None:
+                document_head = ss.document_content_head = ss.document_content[:5000]
+            chunk_lines = "\n".join(f"- {rc['content'][:200]}..." for rc in retrieved_chunks[:RETRIEVED_CHUNK_LIMIT])
             synthesis_prompt = f"""You are analyzing an insurance claim document. Answer the user's question using the information provided.
 
 User Question: {user_question}
@@ -1250,39 +1650,34 @@ Structured Data:
 - Total Indicators: {structured_data['total_indicators']}
 
 Retrieved Document Chunks:
-{chr(10).join([f"- {rc['content'][:200]}..." for rc in retrieved_chunks[:5]])}
+{chunk_lines}
 
 Full Document Context (first 5000 chars):
-{st.session_state.document_content[:5000]}
+{document_head}
 
 Provide a clear, concise answer to the user's question. If you cite specific information, mention where it came from."""
 
-            response = call_gemini(synthesis_prompt, "Synthesizing answer")
-
-            if response.status_code == 200:
-                answer = response.json()['candidates'][0]['content']['parts'][0]['text']
-                status_placeholder.empty()
-
-                st.session_state.chat_messages.append({
-                    "role": "assistant",
-                    "content": answer,
-                    "reasoning_log": {
-                        "sub_queries": sub_queries,
-                        "chunks_retrieved": len(retrieved_chunks)
-                    },
-                    "citations": [
-                        {"document": "claim.pdf", "chunk": rc["chunk_index"]}
-                        for rc in retrieved_chunks[:3]
-                    ],
-                    "status": "done"
-                })
-                st.rerun()
-            else:
-                raise Exception(f"API returned {response.status_code}")
+            answer = call_gemini(synthesis_prompt, "Synthesizing answer")
+            status_placeholder.empty()
+
+            chat_messages.append({
+                "role": "assistant",
+                "content": answer,
+                "reasoning_log": {
+                    "sub_queries": sub_queries,
+                    "chunks_retrieved": len(retrieved_chunks)
+                },
+                "citations": [
+                    {"document": "claim.pdf", "chunk": rc["chunk_index"]}
+                    for rc in retrieved_chunks[:3]
+                ],
+                "status": "done"
+            })
+            st.rerun()
 
         except Exception as e:
             status_placeholder.empty()
-            st.session_state.chat_messages.append({
+            chat_messages.append({
                 "role": "assistant",
                 "content": f"Sorry, I encountered an error: {str(e)}",
                 "status": "error"
@@ -1292,16 +1687,4 @@ Provide a clear, concise answer to the user's question. If you cite specific inf
 # Sidebar is hidden via CSS, so all directory controls are in the main content area
 
 # Footer
-st.markdown(
-    """
-    <div style="margin-top: 3rem; padding: 1.5rem 0 1rem 0; border-top: 1px solid #333333; color: #E0E0E0; display: flex; justify-content: space-between; flex-wrap: wrap; gap: 1rem; font-size: 0.85rem;">
-        <div>Powered by Landing AI ADE + Gemini 2.5 Flash</div>
-        <div>
-            <a href="#" style="color: rgba(138, 180, 255, 0.95); text-decoration: none; margin-right: 1rem;">Privacy Policy</a>
-            <a href="#" style="color: rgba(138, 180, 255, 0.95); text-decoration: none; margin-right: 1rem;">Terms</a>
-            <a href="#" style="color: rgba(138, 180, 255, 0.95); text-decoration: none;">Contact</a>
-        </div>
-    </div>
-    """,
-    unsafe_allow_html=True,
-)
+st.markdown(FOOTER_HTML, unsafe_allow_html=True)